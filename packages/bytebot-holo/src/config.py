@@ -120,6 +120,21 @@ class NavigationStep(BaseModel):
     action: ActionSpace = Field(description="Next action to take")
 
 
+class DialogDetectionResult(BaseModel):
+    """
+    Dialog detection answer parsed from model output.
+    Validated in a single pydantic-core pass; unknown keys are preserved.
+    """
+    model_config = {"extra": "allow"}
+
+    has_dialog: bool = False
+    dialog_type: Optional[str] = None
+    dialog_text: Optional[str] = ""
+    button_options: Optional[List[str]] = Field(default_factory=list)
+    dialog_location: Optional[str] = "unknown"
+    confidence: float = 0.5
+
+
 # Official SYSTEM_PROMPT from HuggingFace Holo1.5-Navigation demo
 # This is the exact prompt used in the official implementation
 OFFICIAL_SYSTEM_PROMPT = """Imagine you are a robot browsing the web, just like humans. Now you need to complete a task.
@@ -199,6 +214,47 @@ Desktop UI Guidelines:
 """
 
 
+# Modal dialog detection prompt (Phase 2.1) - user turn sent with the screenshot
+DIALOG_DETECTION_PROMPT = """DIALOG DETECTION TASK:
+
+Analyze this screenshot and determine if there is a modal dialog, popup, or overlay blocking the main UI.
+
+You MUST return an ANSWER action with a JSON object in this exact format:
+
+{
+  "has_dialog": true/false,
+  "dialog_type": "security" | "confirmation" | "error" | "info" | "warning" | null,
+  "dialog_text": "Full text content of the dialog",
+  "button_options": ["Button 1", "Button 2", "Button 3"],
+  "dialog_location": "center" | "top" | "bottom" | "left" | "right",
+  "confidence": 0.0-1.0
+}
+
+DIALOG TYPES:
+- "security": Permission requests, untrusted application warnings, certificate warnings
+- "confirmation": "Are you sure?" type dialogs requiring user confirmation
+- "error": Error messages, critical warnings
+- "info": Informational popups, tips, welcome messages
+- "warning": Warning messages that aren't critical errors
+
+IMPORTANT:
+- If NO dialog is visible, return: {"has_dialog": false, "dialog_type": null, "dialog_text": "", "button_options": [], "dialog_location": "none", "confidence": 1.0}
+- List ALL visible buttons in the dialog
+- Extract the complete dialog text
+- Use "answer" action, NOT "click_element"
+- Focus on MODAL dialogs that block interaction with the main UI
+
+Example for security dialog:
+{
+  "has_dialog": true,
+  "dialog_type": "security",
+  "dialog_text": "The launcher file firefox.desktop is not trusted. Starting it will run commands as if run in bash shell.",
+  "button_options": ["Launch Anyway", "Mark Executable", "Cancel"],
+  "dialog_location": "center",
+  "confidence": 0.95
+}"""
+
+
 # ============================================================================
 # Legacy Configuration (for backward compatibility)
 # ============================================================================
@@ -308,6 +364,8 @@ class Settings(BaseSettings):
 
     # Device settings (auto = auto-detect, cuda = NVIDIA, mps = Apple Silicon, cpu = CPU)
     device: Literal["auto", "cuda", "mps", "cpu"] = "auto"
+    # Intra-op threads for CPU inference (None = torch's default, one per physical core)
+    cpu_threads: Optional[int] = None
 
     # Model repository (official HuggingFace transformers model)
     model_repo: str = "Hcompany/Holo1.5-7B"
@@ -319,10 +377,27 @@ class Settings(BaseSettings):
     # - float16: Faster but less accurate, works on older GPUs
     # - float32: Maximum accuracy, highest VRAM usage
     torch_dtype: Literal["auto", "bfloat16", "float16", "float32"] = "bfloat16"
+    # Optional lower precision for the vision tower only (auto = same as torch_dtype)
+    # e.g. float16 vision tower with a float32 language model on memory-constrained MPS
+    vision_dtype: Literal["auto", "bfloat16", "float16", "float32"] = "auto"
+    # Quantization of the language model linears (CUDA only)
+    # - int8: bitsandbytes weight-only, ~2x less weight bandwidth per decode step
+    # - nf4: bitsandbytes 4-bit, ~4x less weight bandwidth, frees ~9GB VRAM
+    # - fp8: torchao float8 weights + activations on Ada/Hopper (sm_89+), ~2x
+    #        prefill matmul throughput
+    quantization: Literal["none", "int8", "nf4", "fp8"] = "none"
     trust_remote_code: bool = True  # Required for Holo 1.5 custom model code
+    # Attention kernel (auto = flash_attention_2 on CUDA when flash-attn is installed,
+    # otherwise the transformers default, SDPA)
+    attn_implementation: Literal["auto", "sdpa", "flash_attention_2", "eager"] = "auto"
 
     # Holo 1.5 inference settings
     max_new_tokens: int = 256  # Minimum for multi-element detection (64 was too low - only 1-2 elements)
+    stop_at_json_end: bool = True  # Stop decoding once the output's JSON object closes
+    # Prompt-lookup speculative decoding: draft up to N tokens by matching n-grams
+    # already in the prompt (JSON keys, schema, element names) and verify them in
+    # one forward pass. Lossless under greedy decoding; 0 disables (try 10)
+    prompt_lookup_tokens: int = 0
     temperature: float = 0.0  # Greedy decoding for consistency
     top_p: Optional[float] = None  # Disabled with temperature=0.0
     max_retries: int = 0  # Disabled by default for speed (was 2)
@@ -331,6 +406,25 @@ class Settings(BaseSettings):
     min_confidence_threshold: float = 0.5  # Higher threshold for quality (was 0.3)
     performance_profile: Literal["speed", "balanced", "quality"] = "speed"  # Default to speed
     return_raw_outputs: bool = False
+    # Preprocessed image tensors kept per pixel hash (repeat screenshots skip preprocessing)
+    image_cache_size: int = 4  # ~13MB uint8 per 1080p entry (~50MB float32 without normalize_on_device); 0 disables
+    # Vision tower outputs kept per pixel hash on the model device (repeat screenshots skip the ViT)
+    vision_cache_size: int = 2  # ~20MB of bf16 image embeddings per 1080p entry; 0 disables
+    # Keep preprocessed pixels as uint8 and apply rescale+normalize on the model device
+    # (4x smaller host cache entries and H2D copies, one fused op instead of NumPy passes)
+    normalize_on_device: bool = True
+    # parse_screenshot detections kept per (pixel hash, task, mode); greedy decoding is
+    # deterministic, so identical-screenshot retries skip inference entirely
+    result_cache_size: int = 16  # Element dicts only (a few KB each); 0 disables
+    # Resampling filter for smart resize (bilinear ~5x cheaper than lanczos at equal accuracy)
+    resize_resample: Literal["nearest", "bilinear", "bicubic", "lanczos"] = "bilinear"
+    # Cap on visual tokens per screenshot (one token per 28x28 px after merge).
+    # None = processor default (a 1080p screen is ~2600 tokens); e.g. 1280 roughly
+    # halves ViT + prefill cost at some loss of small-target precision
+    max_visual_tokens: Optional[int] = None
+    # Run one tiny image+text generation at load so CUDA/cuBLAS init and kernel
+    # selection happen at startup instead of on the first real request
+    warmup: bool = True
     active_profile: str = Field("speed", exclude=True)  # Changed default
     active_profile_config: Dict[str, Any] = Field(default_factory=dict, exclude=True)
 
@@ -338,6 +432,12 @@ class Settings(BaseSettings):
     click_box_size: int = 40  # Size of bounding box around click point (pixels)
     deduplication_radius: int = 30  # Radius for deduplicating similar coordinates (pixels)
 
+    # Set-of-Mark image encoding
+    # PNG stays the default (bytebot-agent forwards SOM images as image/png);
+    # jpeg/webp encode several times faster and produce ~10x smaller payloads
+    som_image_format: Literal["png", "jpeg", "webp"] = "png"
+    som_image_quality: int = 85  # Quality for jpeg/webp SOM images
+
     # Prompt engineering for single + multi element detection
     # Simplified based on official Qwen2.5-VL examples (2025 research findings)
     # Less prescriptive = better model compliance + fewer parsing errors
@@ -426,9 +526,11 @@ def get_device() -> Literal["cuda", "mps", "cpu"]:
 
 # Resolve defaults that depend on other fields
 def _ensure_detection_prompts(base: Settings) -> List[str]:
-    """Provide backward-compatible detection prompt list."""
+    """Provide backward-compatible detection prompt list (stripped, de-duplicated, order kept)."""
     if base.detection_prompts:
-        return base.detection_prompts
+        prompts = list(dict.fromkeys(p.strip() for p in base.detection_prompts if p.strip()))
+        if prompts:
+            return prompts
     return DEFAULT_DETECTION_PROMPTS
 
 
@@ -1,17 +1,27 @@
 """Holo 1.5-7B model wrapper using official transformers implementation."""
 
-import base64
+import functools
+import hashlib
 import io
 import json
+import re
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
 import torch
 
 try:
-    from transformers import AutoProcessor, AutoModelForImageTextToText
+    from transformers import (
+        AutoProcessor,
+        AutoModelForImageTextToText,
+        BatchFeature,
+        StoppingCriteria,
+        StoppingCriteriaList,
+    )
     from transformers.models.qwen2_vl.image_processing_qwen2_vl import smart_resize
 except ImportError:
     raise ImportError(
@@ -19,7 +29,371 @@ except ImportError:
         "Install with: pip install transformers>=4.40.0"
     )
 
-from .config import settings, OFFICIAL_SYSTEM_PROMPT, DESKTOP_SYSTEM_PROMPT, NavigationStep
+from .config import (
+    settings,
+    OFFICIAL_SYSTEM_PROMPT,
+    DESKTOP_SYSTEM_PROMPT,
+    DIALOG_DETECTION_PROMPT,
+    NavigationStep,
+    DialogDetectionResult,
+)
+
+try:
+    from pybase64 import b64encode  # Optional: SIMD (AVX2/NEON) base64 codec
+except ImportError:
+    from base64 import b64encode
+
+try:
+    import orjson  # Optional: Rust JSON parser, ~2-5x faster than stdlib json
+except ImportError:
+    orjson = None
+
+try:
+    import xxhash  # Optional: ~10x faster than hashlib for image cache keys
+except ImportError:
+    xxhash = None
+
+
+# Precompiled parsing patterns (compiled once at import instead of per call)
+# Element list lines, all strategies in one multiline pattern scanned once with finditer:
+#   "1. Button at (123, 456): Install button" (element type optional)
+#   "Button at (123, 456): Install"           (element type required)
+#   "(123, 456) - Button: Install"            (coordinates first)
+# Group 1/2: element type (numbered/unnumbered), Group 3-4: coordinates, Group 5: description;
+# Group 6-7: coordinates, Group 8: element type, Group 9: description (coordinates first).
+# Whitespace is [^\S\n] so a match never crosses a line, and descriptions end on a
+# non-space character, matching the per-line strip() + match this replaced.
+_LINE_SPACE = r'[^\S\n]'
+_ELEMENT_LINE_RE = re.compile(
+    rf'^{_LINE_SPACE}*(?:'
+    rf'(?:\d+\.{_LINE_SPACE}*(?:([A-Za-z]+){_LINE_SPACE}+)?|([A-Za-z]+){_LINE_SPACE}+)'
+    rf'at{_LINE_SPACE}+\((\d+),{_LINE_SPACE}*(\d+)\){_LINE_SPACE}*:{_LINE_SPACE}*(.*\S)'
+    rf'|\((\d+),{_LINE_SPACE}*(\d+)\){_LINE_SPACE}*[-:]{_LINE_SPACE}*'
+    rf'(?:([A-Za-z]+){_LINE_SPACE}*:{_LINE_SPACE}*)?(.*\S)'
+    rf'){_LINE_SPACE}*$',
+    re.MULTILINE,
+)
+# Fallback: bare "(x, y)" coordinate pairs anywhere in the answer
+_COORD_PAIR_RE = re.compile(r'\((\d+),\s*(\d+)\)')
+_LEADING_SEPARATORS_RE = re.compile(r'^[\s\-:,]+')
+# Markdown code fence (```json / ```), tolerating a missing closing fence when
+# generation stopped right after the object
+_CODE_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL | re.IGNORECASE)
+# Dialog detection: bare JSON object containing the "has_dialog" key
+_DIALOG_JSON_RE = re.compile(r'\{[^{}]*"has_dialog"[^{}]*\}', re.DOTALL)
+
+# Exact-match lookup for the element types the model emits most often, so the
+# common case skips the substring keyword scan in _normalize_element_type
+_ELEMENT_TYPE_ALIASES: Dict[str, str] = {
+    "button": "button",
+    "btn": "button",
+    "input": "text_input",
+    "field": "text_input",
+    "textbox": "text_input",
+    "text": "text_input",
+    "menu": "menu_item",
+    "dropdown": "menu_item",
+    "select": "menu_item",
+    "checkbox": "checkbox",
+    "radio": "radio_button",
+    "icon": "icon",
+    "image": "icon",
+    "link": "link",
+    "tab": "tab",
+    "interactive": "clickable",
+    "clickable": "clickable",
+}
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Per-thread reusable encode buffer (avoids a fresh multi-MB BytesIO per image)
+_ENCODE_BUFFERS = threading.local()
+
+
+def _get_encode_buffer() -> io.BytesIO:
+    """Return this thread's encode buffer, rewound and emptied."""
+    buffer = getattr(_ENCODE_BUFFERS, "buffer", None)
+    if buffer is None:
+        buffer = io.BytesIO()
+        _ENCODE_BUFFERS.buffer = buffer
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
+
+
+def _loads_json(json_str: str) -> Any:
+    """Parse a JSON string with orjson when installed, stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.loads(json_str)
+    return json.loads(json_str)
+
+
+def _extract_json_object(output_str: str) -> Any:
+    """
+    Extract and parse the JSON payload from raw model output.
+
+    A bare object is handed straight to the JSON parser (orjson when
+    installed). Otherwise strips ```json / ``` fences. If the remaining text is not
+    pure JSON (e.g. prose after the object), decodes the first object
+    starting at the first '{' and ignores the trailing content.
+
+    Args:
+        output_str: Raw model output
+
+    Returns:
+        Parsed JSON value
+
+    Raises:
+        ValueError: If no JSON object can be decoded
+    """
+    # Fast path: the model usually emits a bare JSON object
+    stripped = output_str.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        try:
+            return _loads_json(stripped)
+        except ValueError:
+            pass
+
+    # Remove markdown code blocks if present
+    fence_match = _CODE_FENCE_RE.search(output_str)
+    json_str = fence_match.group(1).strip() if fence_match else stripped
+
+    try:
+        return _loads_json(json_str)
+    except ValueError:
+        # Tolerate leading/trailing prose around a single JSON object
+        object_start = json_str.find("{")
+        if object_start < 0:
+            raise
+        data, _ = _JSON_DECODER.raw_decode(json_str, object_start)
+        return data
+
+
+def _image_digest(image: Image.Image) -> bytes:
+    """Content hash of a PIL image (pixels + size + mode) for cache keys."""
+    hasher = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    hasher.update(f"{image.mode}:{image.size}".encode())
+    hasher.update(image.tobytes())
+    return hasher.digest()
+
+
+class _JsonObjectStoppingCriteria(StoppingCriteria):
+    """
+    Stop generation as soon as the first top-level JSON object is closed.
+
+    Every consumer of run_inference() only parses the first JSON object of
+    the output, so tokens after its closing brace (closing fences, trailing
+    prose) are wasted decode steps. Braces are tracked incrementally per
+    generated token, skipping braces inside JSON strings.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self._consumed = prompt_length
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._done = False
+
+    def _feed(self, text: str) -> None:
+        for char in text:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._depth > 0:
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._done = True
+                    return
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if not self._done:
+            new_tokens = input_ids[0, self._consumed:].tolist()
+            self._consumed = input_ids.shape[1]
+            self._feed(self.tokenizer.decode(new_tokens, skip_special_tokens=True))
+        return torch.full((input_ids.shape[0],), self._done, dtype=torch.bool, device=input_ids.device)
+
+
+class _CachedVisionEncoder(torch.nn.Module):
+    """
+    Memoize vision tower outputs (image embeddings) per screenshot.
+
+    Wraps model.visual. Qwen2.5-VL only calls the tower during prefill, with
+    the request's pixel_values; run_inference sets `cache_key` to the image
+    digest around generate(), so a repeated screenshot reuses its embeddings
+    instead of re-running the ViT. Without a key it is a plain passthrough.
+    """
+
+    def __init__(self, encoder: torch.nn.Module, max_entries: int):
+        super().__init__()
+        self.encoder = encoder
+        self.max_entries = max_entries
+        self.cache_key: Optional[bytes] = None
+        self._cache: "OrderedDict[bytes, torch.Tensor]" = OrderedDict()
+
+    def __getattr__(self, name: str) -> Any:
+        # Expose the wrapped tower's attributes (dtype, config, ...) unchanged
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            if name == "encoder":
+                raise
+            return getattr(self.encoder, name)
+
+    def forward(self, hidden_states: torch.Tensor, *args, **kwargs) -> torch.Tensor:
+        key = self.cache_key
+        if key is not None:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                print("  Vision encoder: cache hit")
+                return cached
+
+        image_embeds = self.encoder(hidden_states, *args, **kwargs)
+
+        if key is not None:
+            self._cache[key] = image_embeds
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        return image_embeds
+
+    def clear(self) -> None:
+        """Drop all cached embeddings."""
+        self._cache.clear()
+
+
+def _to_pil_image(image: Union[np.ndarray, Image.Image]) -> Image.Image:
+    """Return a screenshot as a PIL Image, converting numpy arrays only once."""
+    if isinstance(image, Image.Image):
+        return image
+    # asarray is a no-op for the usual uint8 screenshot (np.uint8() always copied)
+    return Image.fromarray(np.asarray(image, dtype=np.uint8))
+
+
+# Rendered chat-template prompts / prompt token ids kept per distinct prompt
+_PROMPT_CACHE_SIZE = 32
+
+
+def _message_signature(messages: List[Dict[str, Any]]) -> Tuple[Any, ...]:
+    """
+    Hashable key for everything the chat template renders from messages.
+
+    Image parts render as a fixed placeholder, so only roles, part types and
+    texts matter; the PIL images themselves are left out of the key.
+    """
+    signature = []
+    for message in messages:
+        content = message["content"]
+        if not isinstance(content, str):
+            content = tuple((part.get("type"), part.get("text")) for part in content)
+        signature.append((message["role"], content))
+    return tuple(signature)
+
+
+def _make_elements(
+    points: List[Tuple[int, int]],
+    types: List[str],
+    captions: List[str],
+    confidence: float,
+) -> List[Dict[str, Any]]:
+    """
+    Build detection dicts for parsed click points.
+
+    Each element gets a 40px square bbox around its point, computed with
+    plain Python ints so out-of-range model coordinates can't overflow.
+
+    Args:
+        points: (x, y) click points
+        types: Normalized element type per point
+        captions: Caption per point
+        confidence: Confidence assigned to every element
+
+    Returns:
+        List of elements with bbox, center, confidence, type, caption, element_id
+    """
+    return [
+        {
+            "bbox": [x - 20, y - 20, 40, 40],
+            "center": [x, y],
+            "confidence": confidence,
+            "type": element_type,
+            "caption": caption,
+            "element_id": idx,
+        }
+        for idx, ((x, y), element_type, caption) in enumerate(zip(points, types, captions))
+    ]
+
+
+def _copy_elements(elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copy element dicts along with their bbox/center lists (the only mutable values)."""
+    return [
+        {**element, "bbox": list(element["bbox"]), "center": list(element["center"])}
+        for element in elements
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_som_font() -> ImageFont.ImageFont:
+    """
+    Load the SOM label font once per process.
+
+    Tries DejaVu Sans Bold (Linux/Docker), then Helvetica (macOS), and falls
+    back to Pillow's built-in bitmap font if neither is available.
+    """
+    for font_path in (
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+        "/System/Library/Fonts/Helvetica.ttc",
+    ):
+        try:
+            return ImageFont.truetype(font_path, 16)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=None)
+def _detect_host_platform() -> str:
+    """Map the host OS to the platform name used in the system prompt."""
+    import platform as platform_module
+    system = platform_module.system().lower()
+    if system == "darwin":
+        return "macOS"
+    elif system == "windows":
+        return "Windows"
+    elif system == "linux":
+        return "Linux"
+    return "desktop"
+
+
+@functools.lru_cache(maxsize=16)
+def _format_system_prompt(use_desktop_prompt: bool, platform: str, date: str) -> str:
+    """
+    Render the navigation system prompt.
+
+    The result only varies with prompt flavour, platform and date, so it is
+    memoized instead of re-running the pydantic schema generation and
+    string formatting on every request.
+    """
+    # Select system prompt based on context (Phase 2.1 - desktop optimization)
+    base_prompt = DESKTOP_SYSTEM_PROMPT if use_desktop_prompt else OFFICIAL_SYSTEM_PROMPT
+
+    # Format system prompt with output schema and platform context
+    return base_prompt.format(
+        output_format=NavigationStep.model_json_schema(),
+        timestamp=date,
+        platform=platform,  # Add platform context
+    )
 
 
 class Holo15:
@@ -49,6 +423,11 @@ class Holo15:
         else:
             self.torch_dtype = torch.float32
 
+        if self.device == "cpu" and settings.cpu_threads:
+            # torch already defaults to the physical cores; only override when asked
+            torch.set_num_threads(settings.cpu_threads)
+            print(f"  CPU threads: {settings.cpu_threads}")
+
         print(f"Loading Holo 1.5-7B (transformers) on {self.device}...")
         print(f"  Model repo: {self.model_repo}")
         print(f"  Torch dtype: {self.torch_dtype}")
@@ -57,8 +436,65 @@ class Holo15:
         # Load model and processor
         self.model, self.processor = self._load_model()
 
+        # Per-column affine for on-device normalization of raw uint8 pixel patches
+        self._pixel_scale: Optional[torch.Tensor] = None
+        self._pixel_shift: Optional[torch.Tensor] = None
+        if settings.normalize_on_device:
+            self._pixel_scale, self._pixel_shift = self._build_pixel_affine()
+
+        # LRU of preprocessed image tensors keyed by pixel hash
+        self._image_inputs_cache: "OrderedDict[bytes, BatchFeature]" = OrderedDict()
+
+        # LRU of vision tower outputs keyed by the same hash (skips the ViT on repeats)
+        self._vision_encoder: Optional[_CachedVisionEncoder] = None
+        if settings.vision_cache_size > 0 and getattr(self.model, "visual", None) is not None:
+            self._vision_encoder = _CachedVisionEncoder(self.model.visual, settings.vision_cache_size)
+            self.model.visual = self._vision_encoder
+
+        # Rendered prompts and their token ids (images don't affect either)
+        self._prompt_text_cache: "OrderedDict[Tuple[Any, ...], str]" = OrderedDict()
+        self._prompt_ids_cache: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+
+        # LRU of parse_screenshot detections keyed by (pixel hash, task, mode, cap)
+        self._result_cache: "OrderedDict[Tuple[Any, ...], Tuple[Any, ...]]" = OrderedDict()
+
+        if settings.warmup:
+            self.warmup()
+
         print(f"✓ Holo 1.5-7B loaded successfully (device={self.device}, dtype={self.torch_dtype})")
 
+    def warmup(self) -> None:
+        """
+        Run a single-token generation on a small blank image.
+
+        Pays one-time costs (CUDA context/cuBLAS handles, kernel selection,
+        allocator growth for both the vision tower and the language model) at
+        startup. Failures are logged and ignored; warmup must never block loading.
+        """
+        start = time.time()
+        try:
+            blank_image, _ = self._smart_resize_image(Image.new("RGB", (224, 224)))
+            messages = [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image", "image": blank_image},
+                        {"type": "text", "text": "ok"},
+                    ],
+                }
+            ]
+            self.run_inference(messages, blank_image, max_new_tokens=1)
+            print(f"✓ Warmup completed in {(time.time() - start) * 1000:.0f}ms")
+        except Exception as e:
+            print(f"⚠ Warmup failed (continuing): {e}")
+        finally:
+            # The blank image and "ok" prompt must not occupy real request slots
+            self._image_inputs_cache.clear()
+            self._prompt_text_cache.clear()
+            self._prompt_ids_cache.clear()
+            if self._vision_encoder is not None:
+                self._vision_encoder.clear()
+
     def _load_model(self) -> Tuple[AutoModelForImageTextToText, AutoProcessor]:
         """Load model and processor using official transformers API."""
         try:
@@ -88,6 +524,11 @@ class Holo15:
                 from transformers.models.qwen2_5_vl.configuration_qwen2_5_vl import Qwen2_5_VLVisionConfig
                 config.vision_config = Qwen2_5_VLVisionConfig(**config.vision_config)
 
+            attn_implementation = self._resolve_attn_implementation()
+            print(f"  Attention: {attn_implementation or 'default (sdpa)'}")
+
+            quantization_config = self._build_quantization_config()
+
             # Load model with fixed config
             model = AutoModelForImageTextToText.from_pretrained(
                 self.model_repo,
@@ -95,11 +536,16 @@ class Holo15:
                 torch_dtype=self.torch_dtype,
                 trust_remote_code=settings.trust_remote_code,
                 cache_dir=str(settings.cache_dir) if settings.cache_models else None,
+                attn_implementation=attn_implementation,
+                quantization_config=quantization_config,
+                # bitsandbytes places weights at load time (quantized models can't .to())
+                device_map={"": 0} if quantization_config is not None else None,
             )
 
             # Move model to device
             if self.device == "cuda":
-                model = model.to("cuda")
+                if quantization_config is None:
+                    model = model.to("cuda")
                 # Verify GPU is actually being used
                 if torch.cuda.is_available():
                     gpu_name = torch.cuda.get_device_name(0)
@@ -112,12 +558,137 @@ class Holo15:
                 # CPU mode
                 print("⚠ Model loaded on CPU (slower inference)")
 
+            if settings.quantization == "fp8":
+                self._apply_fp8_quantization(model)
+
+            # Optionally cast only the vision tower (Qwen2.5-VL casts pixel_values
+            # to the tower dtype and image embeddings back to the LM dtype)
+            if settings.vision_dtype != "auto":
+                vision_dtype = getattr(torch, settings.vision_dtype)
+                visual = getattr(model, "visual", None)
+                if visual is None:
+                    print("⚠ Vision tower not found, ignoring vision_dtype")
+                elif self.device == "cpu" and vision_dtype != torch.float32:
+                    print(f"⚠ Reduced-precision vision tower not supported on CPU, keeping {self.torch_dtype}")
+                else:
+                    visual.to(dtype=vision_dtype)
+                    print(f"✓ Vision tower dtype: {vision_dtype}")
+
+            # Decoding is always greedy: drop the checkpoint's sampling defaults once
+            # so generate() doesn't re-validate and warn about them on every call
+            generation_config = model.generation_config
+            generation_config.do_sample = False
+            generation_config.temperature = None
+            generation_config.top_p = None
+            generation_config.top_k = None
+
             return model, processor
 
         except Exception as e:
             print(f"✗ Failed to load Holo 1.5-7B: {e}")
             raise
 
+    def _resolve_attn_implementation(self) -> Optional[str]:
+        """
+        Pick the attention kernel passed to from_pretrained.
+
+        FlashAttention-2 fuses QK^T/softmax/V into one kernel (less HBM traffic on
+        the long vision prefill) but needs CUDA, fp16/bf16 and the flash-attn package.
+
+        Returns:
+            attn_implementation name, or None for the transformers default
+        """
+        requested = settings.attn_implementation
+        if requested not in ("auto", "flash_attention_2"):
+            return requested
+
+        usable = self.device == "cuda" and self.torch_dtype in (torch.float16, torch.bfloat16)
+        if usable:
+            try:
+                import flash_attn  # noqa: F401
+            except ImportError:
+                usable = False
+
+        if usable:
+            return "flash_attention_2"
+        if requested == "flash_attention_2":
+            print("⚠ flash_attention_2 needs CUDA, fp16/bf16 and flash-attn; falling back to sdpa")
+            return "sdpa"
+        return None
+
+    def _apply_fp8_quantization(self, model: AutoModelForImageTextToText) -> None:
+        """
+        Convert language model linears to float8 (dynamic activations + weights).
+
+        FP8 tensor cores on sm_89+ roughly double matmul throughput for the
+        prefill and halve weight bandwidth for decode. The vision tower and
+        lm_head keep torch_dtype, matching the bitsandbytes modes.
+
+        Args:
+            model: Loaded model on CUDA (quantized in place)
+        """
+        if self.device != "cuda" or torch.cuda.get_device_capability() < (8, 9):
+            print("⚠ fp8 quantization requires an Ada/Hopper GPU (sm_89+), keeping unquantized weights")
+            return
+
+        try:
+            from torchao.quantization import quantize_, float8_dynamic_activation_float8_weight
+        except ImportError:
+            print("⚠ torchao not installed, keeping unquantized weights")
+            return
+
+        def _is_language_linear(module: torch.nn.Module, fqn: str) -> bool:
+            return (
+                isinstance(module, torch.nn.Linear)
+                and not fqn.startswith("visual")
+                and not fqn.startswith("lm_head")
+            )
+
+        quantize_(model, float8_dynamic_activation_float8_weight(), filter_fn=_is_language_linear)
+        print("✓ Language model linears quantized to fp8 (torchao)")
+
+    def _build_quantization_config(self) -> Optional[Any]:
+        """
+        Build the bitsandbytes config for settings.quantization.
+
+        Decode is weight-bandwidth bound, so int8/nf4 weights speed up each
+        generated token roughly in proportion to the bytes saved. The vision
+        tower and lm_head stay in torch_dtype to protect localization accuracy.
+
+        Returns:
+            BitsAndBytesConfig, or None when quantization is off or unavailable
+        """
+        if settings.quantization in ("none", "fp8"):
+            return None
+        if self.device != "cuda":
+            print(f"⚠ {settings.quantization} quantization requires CUDA, loading unquantized weights")
+            return None
+
+        try:
+            from transformers import BitsAndBytesConfig
+            import bitsandbytes  # noqa: F401
+        except ImportError:
+            print("⚠ bitsandbytes not installed, loading unquantized weights")
+            return None
+
+        skip_modules = ["visual", "lm_head"]
+        if settings.quantization == "int8":
+            quantization_config = BitsAndBytesConfig(
+                load_in_8bit=True,
+                llm_int8_skip_modules=skip_modules,
+            )
+        else:
+            quantization_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=self.torch_dtype,
+                bnb_4bit_use_double_quant=True,
+                llm_int8_skip_modules=skip_modules,
+            )
+
+        print(f"  Quantization: {settings.quantization} (bitsandbytes, vision tower unquantized)")
+        return quantization_config
+
     def _smart_resize_image(
         self,
         image: Image.Image,
@@ -138,20 +709,38 @@ class Holo15:
         # Get processor config
         image_proc_config = self.processor.image_processor
 
+        factor = image_proc_config.patch_size * image_proc_config.merge_size
+        max_pixels = image_proc_config.max_pixels
+        if settings.max_visual_tokens:
+            # Visual token budget bounds ViT attention and LM prefill length
+            max_pixels = max(
+                min(max_pixels, settings.max_visual_tokens * factor * factor),
+                image_proc_config.min_pixels,
+            )
+
         # Use official smart_resize from Qwen2.5-VL
         resized_height, resized_width = smart_resize(
             height=original_height,
             width=original_width,
-            factor=image_proc_config.patch_size * image_proc_config.merge_size,
+            factor=factor,
             min_pixels=image_proc_config.min_pixels,
-            max_pixels=image_proc_config.max_pixels,
+            max_pixels=max_pixels,
         )
 
-        # Resize image
-        resized_image = image.resize(
-            size=(resized_width, resized_height),
-            resample=Image.Resampling.LANCZOS,
-        )
+        # Resize image (skipped when the screenshot already has compliant dims)
+        # BILINEAR (default) is ~5x cheaper than LANCZOS and indistinguishable at
+        # the model's 28px patch granularity (Pillow-SIMD accelerates it further);
+        # HOLO_RESIZE_RESAMPLE=lanczos restores the previous filter
+        if resized_width == original_width and resized_height == original_height:
+            resized_image = image
+        else:
+            resized_image = image.resize(
+                size=(resized_width, resized_height),
+                resample=Image.Resampling[settings.resize_resample.upper()],
+                # Large downscales (e.g. 4K/5K screens over max_pixels) first
+                # take a cheap integer box reduction, then resample the rest
+                reducing_gap=3.0,
+            )
 
         # Calculate scale factors for coordinate conversion
         scale_factors = {
@@ -189,27 +778,16 @@ class Holo15:
         Returns:
             List of message dicts for the model
         """
-        # Select system prompt based on context (Phase 2.1 - desktop optimization)
-        base_prompt = DESKTOP_SYSTEM_PROMPT if use_desktop_prompt else OFFICIAL_SYSTEM_PROMPT
-
         # Detect platform if not specified
         if platform == "desktop":
-            import platform as platform_module
-            system = platform_module.system().lower()
-            if system == "darwin":
-                platform = "macOS"
-            elif system == "windows":
-                platform = "Windows"
-            elif system == "linux":
-                platform = "Linux"
-            else:
-                platform = "desktop"
-
-        # Format system prompt with output schema and platform context
-        system_prompt = base_prompt.format(
-            output_format=NavigationStep.model_json_schema(),
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            platform=platform,  # Add platform context
+            platform = _detect_host_platform()
+
+        # Date-only timestamp keeps the system prompt byte-identical across
+        # requests on the same day, so the prompt prefix stays cacheable
+        system_prompt = _format_system_prompt(
+            use_desktop_prompt,
+            platform,
+            datetime.now().strftime("%Y-%m-%d"),
         )
 
         # Build messages in official format
@@ -235,11 +813,13 @@ class Holo15:
 
         return messages
 
+    @torch.inference_mode()
     def run_inference(
         self,
         messages: List[Dict[str, Any]],
         image: Image.Image,
         max_new_tokens: Optional[int] = None,
+        image_key: Optional[bytes] = None,
     ) -> str:
         """
         Run inference using the official transformers pipeline.
@@ -248,9 +828,17 @@ class Holo15:
             messages: Message list from get_navigation_prompt()
             image: Resized PIL Image
             max_new_tokens: Maximum tokens to generate (default: settings.max_new_tokens)
+            image_key: Precomputed _image_digest of the screenshot, if already available.
+                The pre-resize digest is a valid key: _smart_resize_image is
+                deterministic for the process's settings, and an already resized
+                image resizes to itself.
 
         Returns:
             Raw model output string
+
+        Runs under torch.inference_mode() so preprocessing, the token splice and
+        output trimming skip autograd tracking and version-counter bumps too,
+        not just generate() (which only applies no_grad internally).
         """
         start_time = time.time()
 
@@ -258,37 +846,54 @@ class Holo15:
         if max_new_tokens is None:
             max_new_tokens = settings.max_new_tokens
 
-        # Apply chat template to messages
-        text_prompt = self.processor.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True,
-        )
+        # Apply chat template to messages (cached per distinct prompt)
+        text_prompt = self._render_chat_template(messages)
 
-        # Process text and image together
-        inputs = self.processor(
-            text=[text_prompt],
-            images=[image],
-            padding=True,
-            return_tensors="pt",
-        )
+        # Pixel hash keys both the preprocessing and the vision encoder caches
+        if image_key is None and (settings.image_cache_size > 0 or self._vision_encoder is not None):
+            image_key = _image_digest(image)
 
-        # Move inputs to device
-        inputs = inputs.to(self.model.device)
+        # Process text and image together (image tensors cached by pixel hash)
+        inputs = self._prepare_inputs(text_prompt, image, image_key)
+
+        # Move inputs to device (async from pinned memory; generate() runs on the same stream)
+        inputs = inputs.to(self.model.device, non_blocking=True)
+        if self._pixel_scale is not None:
+            # (x * rescale - mean) / std as one fused multiply-add per element
+            inputs["pixel_values"] = torch.addcmul(
+                self._pixel_shift, inputs["pixel_values"].float(), self._pixel_scale
+            )
 
         # Generate response
         # Using do_sample=False for deterministic output (matches official demo)
-        generated_ids = self.model.generate(
-            **inputs,
-            max_new_tokens=max_new_tokens,
-            do_sample=False,  # Greedy decoding for consistency
-        )
+        generate_kwargs = {}
+        if settings.stop_at_json_end:
+            # End decoding once the answer's JSON object is complete instead of
+            # running on to EOS / max_new_tokens
+            generate_kwargs["stopping_criteria"] = StoppingCriteriaList([
+                _JsonObjectStoppingCriteria(self.processor.tokenizer, inputs.input_ids.shape[1])
+            ])
+
+        if settings.prompt_lookup_tokens > 0:
+            # Templated JSON output mostly repeats prompt n-grams, so drafted
+            # tokens are usually accepted several at a time
+            generate_kwargs["prompt_lookup_num_tokens"] = settings.prompt_lookup_tokens
+
+        if self._vision_encoder is not None:
+            self._vision_encoder.cache_key = image_key
+        try:
+            generated_ids = self.model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,  # Greedy decoding for consistency
+                **generate_kwargs,
+            )
+        finally:
+            if self._vision_encoder is not None:
+                self._vision_encoder.cache_key = None
 
-        # Trim input_ids from generated_ids to get only generated part
-        generated_ids_trimmed = [
-            out_ids[len(in_ids):]
-            for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-        ]
+        # Trim the prompt from generated_ids in one slice (rows share the prompt length)
+        generated_ids_trimmed = generated_ids[:, inputs.input_ids.shape[1]:]
 
         # Decode generated tokens
         decoded_output = self.processor.batch_decode(
@@ -304,19 +909,177 @@ class Holo15:
 
         return output
 
+    def _get_image_inputs(self, image: Image.Image, image_key: Optional[bytes] = None) -> BatchFeature:
+        """
+        Preprocess image into pixel_values / image_grid_thw, cached by pixel hash.
+
+        Retries and back-to-back endpoints often send the identical screenshot,
+        so repeated frames skip the image processor's rescale/normalize/patchify.
+
+        Args:
+            image: Resized PIL Image
+            image_key: Precomputed _image_digest(image), if already available
+
+        Returns:
+            BatchFeature with pixel_values and image_grid_thw (CPU tensors; raw uint8 pixels when normalizing on device)
+        """
+        cache_size = settings.image_cache_size
+        key = None
+        if cache_size > 0:
+            key = image_key if image_key is not None else _image_digest(image)
+
+        if key is not None:
+            cached = self._image_inputs_cache.get(key)
+            if cached is not None:
+                self._image_inputs_cache.move_to_end(key)
+                print("  Image preprocessing: cache hit")
+                return cached
+
+        # _smart_resize_image already produced smart_resize-compliant dims, so skip
+        # the image processor's own (identical-size but full-cost) resample
+        image_inputs = self.processor.image_processor(
+            images=[image],
+            do_resize=False,
+            # Raw uint8 patches when normalizing on device (see _build_pixel_affine)
+            do_rescale=self._pixel_scale is None,
+            do_normalize=self._pixel_scale is None,
+            return_tensors="pt",
+        )
+
+        if self.device == "cuda":
+            # Page-locked pixels let the H2D copy run asynchronously (and cached
+            # entries stay pinned, so repeats skip the staging copy too)
+            image_inputs["pixel_values"] = image_inputs["pixel_values"].pin_memory()
+
+        if key is not None:
+            self._image_inputs_cache[key] = image_inputs
+            while len(self._image_inputs_cache) > cache_size:
+                self._image_inputs_cache.popitem(last=False)
+
+        return image_inputs
+
+    def _build_pixel_affine(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Precompute per-column scale/shift that rescale and normalize raw patches.
+
+        The Qwen2.5-VL image processor flattens each patch as
+        (channel, temporal, patch_h, patch_w), so every block of
+        temporal_patch_size * patch_size**2 columns belongs to one channel.
+
+        Returns:
+            (scale, shift) float32 row vectors on the model device
+        """
+        image_processor = self.processor.image_processor
+        values_per_channel = image_processor.temporal_patch_size * image_processor.patch_size ** 2
+        mean = torch.tensor(image_processor.image_mean, dtype=torch.float32)
+        std = torch.tensor(image_processor.image_std, dtype=torch.float32)
+
+        scale = (image_processor.rescale_factor / std).repeat_interleave(values_per_channel)
+        shift = (-mean / std).repeat_interleave(values_per_channel)
+        return scale.to(self.model.device), shift.to(self.model.device)
+
+    def _render_chat_template(self, messages: List[Dict[str, Any]]) -> str:
+        """
+        Render messages with the processor's chat template, cached per prompt.
+
+        The system prompt and detection/dialog prompts repeat across calls and
+        only the image changes, which the template renders as a fixed
+        placeholder, so the Jinja render runs once per distinct prompt.
+
+        Args:
+            messages: Message list from get_navigation_prompt()
+
+        Returns:
+            Rendered prompt text with one image placeholder
+        """
+        key = _message_signature(messages)
+        text_prompt = self._prompt_text_cache.get(key)
+        if text_prompt is not None:
+            self._prompt_text_cache.move_to_end(key)
+            return text_prompt
+
+        text_prompt = self.processor.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+        self._prompt_text_cache[key] = text_prompt
+        while len(self._prompt_text_cache) > _PROMPT_CACHE_SIZE:
+            self._prompt_text_cache.popitem(last=False)
+        return text_prompt
+
+    def _prepare_inputs(
+        self,
+        text_prompt: str,
+        image: Image.Image,
+        image_key: Optional[bytes] = None,
+    ) -> BatchFeature:
+        """
+        Build model inputs equivalent to processor(text=[...], images=[...]).
+
+        Args:
+            text_prompt: Chat-template rendered prompt containing one image token
+            image: Resized PIL Image
+            image_key: Precomputed _image_digest(image), if already available
+
+        Returns:
+            BatchFeature with input_ids, attention_mask, pixel_values, image_grid_thw
+        """
+        image_inputs = self._get_image_inputs(image, image_key)
+
+        # Expand the image placeholder to one token per merged patch group
+        # (mirrors Qwen2.5-VL processor.__call__)
+        merge_length = self.processor.image_processor.merge_size ** 2
+        num_image_tokens = int(image_inputs["image_grid_thw"][0].prod()) // merge_length
+        image_token = self.processor.image_token
+        image_token_id = self.processor.tokenizer.convert_tokens_to_ids(image_token)
+
+        # Tokenize the prompt with the single placeholder and splice the
+        # repeated image token ids in afterwards, instead of tokenizing a
+        # string with thousands of copies of the placeholder. The image token
+        # is a special token, so its neighbours tokenize identically.
+        input_ids = self._prompt_ids_cache.get(text_prompt)
+        if input_ids is None:
+            input_ids = self.processor.tokenizer([text_prompt], return_tensors="pt")["input_ids"][0]
+            self._prompt_ids_cache[text_prompt] = input_ids
+            while len(self._prompt_ids_cache) > _PROMPT_CACHE_SIZE:
+                self._prompt_ids_cache.popitem(last=False)
+        else:
+            self._prompt_ids_cache.move_to_end(text_prompt)
+        image_positions = (input_ids == image_token_id).nonzero()
+
+        if len(image_positions) == 1:
+            position = int(image_positions[0])
+            input_ids = torch.cat([
+                input_ids[:position],
+                input_ids.new_full((num_image_tokens,), image_token_id),
+                input_ids[position + 1:],
+            ]).unsqueeze(0)
+            text_inputs = {
+                "input_ids": input_ids,
+                "attention_mask": torch.ones_like(input_ids),
+            }
+        else:
+            text = text_prompt.replace(image_token, image_token * num_image_tokens, 1)
+            text_inputs = self.processor.tokenizer([text], padding=True, return_tensors="pt")
+
+        return BatchFeature(data={**text_inputs, **image_inputs})
+
     def navigate(
         self,
-        image_array: np.ndarray,
+        image_array: Union[np.ndarray, Image.Image],
         task: str,
         step: int = 1,
+        image_key: Optional[bytes] = None,
     ) -> tuple[NavigationStep, Dict[str, Any]]:
         """
         Main navigation function - analyze screenshot and return next action.
 
         Args:
-            image_array: Screenshot as numpy array
+            image_array: Screenshot as numpy array (or an already converted PIL Image)
             task: Task description (e.g., "Find the search bar")
             step: Current step number
+            image_key: Precomputed _image_digest of the screenshot, if already available
 
         Returns:
             Tuple of (NavigationStep, timing_dict) with detailed timing breakdown
@@ -325,7 +1088,7 @@ class Holo15:
 
         # Convert to PIL Image
         start = time.time()
-        pil_image = Image.fromarray(np.uint8(image_array))
+        pil_image = _to_pil_image(image_array)
         timing['convert_ms'] = (time.time() - start) * 1000
 
         # Apply smart resize
@@ -340,7 +1103,7 @@ class Holo15:
 
         # Run inference
         start = time.time()
-        output_str = self.run_inference(messages, resized_image)
+        output_str = self.run_inference(messages, resized_image, image_key=image_key)
         timing['inference_ms'] = (time.time() - start) * 1000
         timing['raw_output'] = output_str
         timing['output_length'] = len(output_str)
@@ -376,23 +1139,21 @@ class Holo15:
         """
         # Try to extract JSON from output
         try:
-            # Remove markdown code blocks if present
-            if "```json" in output_str:
-                start = output_str.find("```json") + 7
-                end = output_str.find("```", start)
-                json_str = output_str[start:end].strip()
-            elif "```" in output_str:
-                start = output_str.find("```") + 3
-                end = output_str.find("```", start)
-                json_str = output_str[start:end].strip()
-            else:
-                json_str = output_str.strip()
-
-            # Parse JSON
-            data = json.loads(json_str)
-
-            # Convert to NavigationStep
-            navigation_step = NavigationStep(**data)
+            navigation_step = None
+            stripped = output_str.strip()
+            if stripped.startswith("{") and stripped.endswith("}"):
+                # Typed decode straight from the JSON text (pydantic-core, no
+                # intermediate dict); falls through for fenced/irregular output
+                try:
+                    navigation_step = NavigationStep.model_validate_json(stripped)
+                except ValueError:
+                    navigation_step = None
+
+            if navigation_step is None:
+                data = _extract_json_object(output_str)
+
+                # Convert to NavigationStep
+                navigation_step = NavigationStep(**data)
 
             # Scale coordinates back to original image size
             self._scale_coordinates(navigation_step.action, scale_factors)
@@ -425,19 +1186,20 @@ class Holo15:
         Modifies action in-place.
         """
         # Only scale actions with x, y coordinates
-        if hasattr(action, 'x') and hasattr(action, 'y'):
-            if action.x is not None and action.y is not None:
-                original_x = int(action.x * scale_factors['width_scale'])
-                original_y = int(action.y * scale_factors['height_scale'])
+        x = getattr(action, 'x', None)
+        y = getattr(action, 'y', None)
+        if x is not None and y is not None:
+            original_x = int(x * scale_factors['width_scale'])
+            original_y = int(y * scale_factors['height_scale'])
 
-                print(f"  Coordinate scaling: ({action.x}, {action.y}) → ({original_x}, {original_y})")
+            print(f"  Coordinate scaling: ({x}, {y}) → ({original_x}, {original_y})")
 
-                action.x = original_x
-                action.y = original_y
+            action.x = original_x
+            action.y = original_y
 
     def detect_modal_dialog(
         self,
-        image_array: np.ndarray,
+        image_array: Union[np.ndarray, Image.Image],
     ) -> Dict[str, Any]:
         """
         Detect modal dialogs or popups that may be blocking UI interaction.
@@ -445,7 +1207,7 @@ class Holo15:
         Phase 2.1: Modal Dialog Detection
 
         Args:
-            image_array: Screenshot as numpy array
+            image_array: Screenshot as numpy array (or an already converted PIL Image)
 
         Returns:
             Dict with dialog detection results:
@@ -462,7 +1224,7 @@ class Holo15:
 
         # Convert to PIL Image
         start = time.time()
-        pil_image = Image.fromarray(np.uint8(image_array))
+        pil_image = _to_pil_image(image_array)
         timing['convert_ms'] = (time.time() - start) * 1000
 
         # Apply smart resize
@@ -470,53 +1232,14 @@ class Holo15:
         resized_image, scale_factors = self._smart_resize_image(pil_image)
         timing['resize_ms'] = (time.time() - start) * 1000
 
-        # Create dialog detection prompt
+        # Build dialog detection messages (prompt text is a module constant)
         start = time.time()
-        dialog_prompt = """DIALOG DETECTION TASK:
-
-Analyze this screenshot and determine if there is a modal dialog, popup, or overlay blocking the main UI.
-
-You MUST return an ANSWER action with a JSON object in this exact format:
-
-{
-  "has_dialog": true/false,
-  "dialog_type": "security" | "confirmation" | "error" | "info" | "warning" | null,
-  "dialog_text": "Full text content of the dialog",
-  "button_options": ["Button 1", "Button 2", "Button 3"],
-  "dialog_location": "center" | "top" | "bottom" | "left" | "right",
-  "confidence": 0.0-1.0
-}
-
-DIALOG TYPES:
-- "security": Permission requests, untrusted application warnings, certificate warnings
-- "confirmation": "Are you sure?" type dialogs requiring user confirmation
-- "error": Error messages, critical warnings
-- "info": Informational popups, tips, welcome messages
-- "warning": Warning messages that aren't critical errors
-
-IMPORTANT:
-- If NO dialog is visible, return: {"has_dialog": false, "dialog_type": null, "dialog_text": "", "button_options": [], "dialog_location": "none", "confidence": 1.0}
-- List ALL visible buttons in the dialog
-- Extract the complete dialog text
-- Use "answer" action, NOT "click_element"
-- Focus on MODAL dialogs that block interaction with the main UI
-
-Example for security dialog:
-{
-  "has_dialog": true,
-  "dialog_type": "security",
-  "dialog_text": "The launcher file firefox.desktop is not trusted. Starting it will run commands as if run in bash shell.",
-  "button_options": ["Launch Anyway", "Mark Executable", "Cancel"],
-  "dialog_location": "center",
-  "confidence": 0.95
-}"""
-
         messages = [
             {
                 "role": "user",
                 "content": [
                     {"type": "image", "image": resized_image},
-                    {"type": "text", "text": dialog_prompt},
+                    {"type": "text", "text": DIALOG_DETECTION_PROMPT},
                 ],
             }
         ]
@@ -530,32 +1253,16 @@ Example for security dialog:
         # Parse dialog detection result
         start = time.time()
         try:
-            # Extract JSON from answer
-            if "```json" in output_str:
-                start_idx = output_str.find("```json") + 7
-                end_idx = output_str.find("```", start_idx)
-                json_str = output_str[start_idx:end_idx].strip()
-            elif "```" in output_str:
-                start_idx = output_str.find("```") + 3
-                end_idx = output_str.find("```", start_idx)
-                json_str = output_str[start_idx:end_idx].strip()
+            # Extract JSON from answer, preferring a bare object with the
+            # "has_dialog" key when the output is not fenced
+            json_match = None if "```" in output_str else _DIALOG_JSON_RE.search(output_str)
+            if json_match:
+                data = _loads_json(json_match.group(0))
             else:
-                # Try to find JSON object in output
-                json_match = re.search(r'\{[^{}]*"has_dialog"[^{}]*\}', output_str, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                else:
-                    json_str = output_str.strip()
-
-            result = json.loads(json_str)
+                data = _extract_json_object(output_str)
 
-            # Validate and normalize result
-            result['has_dialog'] = bool(result.get('has_dialog', False))
-            result['dialog_type'] = result.get('dialog_type', None)
-            result['dialog_text'] = result.get('dialog_text', '')
-            result['button_options'] = result.get('button_options', [])
-            result['dialog_location'] = result.get('dialog_location', 'unknown')
-            result['confidence'] = float(result.get('confidence', 0.5))
+            # Validate and normalize result (defaults fill missing keys)
+            result = DialogDetectionResult.model_validate(data).model_dump()
             result['timing'] = timing
 
             print(f"\n🔍 Dialog Detection Result:")
@@ -588,9 +1295,10 @@ Example for security dialog:
 
     def detect_multiple_elements(
         self,
-        image_array: np.ndarray,
+        image_array: Union[np.ndarray, Image.Image],
         max_detections: int = 20,
         max_new_tokens: int = 1024,  # Increased to 1024 for comprehensive multi-element lists
+        image_key: Optional[bytes] = None,
     ) -> List[Dict[str, Any]]:
         """
         Detect multiple UI elements using a single comprehensive prompt.
@@ -603,9 +1311,10 @@ Example for security dialog:
         elements in structured format.
 
         Args:
-            image_array: Screenshot as numpy array
+            image_array: Screenshot as numpy array (or an already converted PIL Image)
             max_detections: Maximum elements to return
             max_new_tokens: Token limit for generation (512 for ~20-40 elements)
+            image_key: Precomputed _image_digest of the screenshot, if already available
 
         Returns:
             List of detected elements with bbox, center, confidence, caption
@@ -637,6 +1346,7 @@ Example for security dialog:
                 image_array=image_array,
                 task=comprehensive_task,
                 step=1,
+                image_key=image_key,
             )
 
             # Log model's reasoning (Phase 2.2 - thought field insights)
@@ -676,19 +1386,12 @@ Example for security dialog:
                     return elements
 
             # Fallback: If model returned a single click action, extract that one element
-            if hasattr(action, 'x') and hasattr(action, 'y'):
-                if action.x is not None and action.y is not None:
-                    element = {
-                        "bbox": [action.x - 20, action.y - 20, 40, 40],
-                        "center": [action.x, action.y],
-                        "confidence": 0.80,  # Higher confidence for comprehensive analysis
-                        "type": "clickable",
-                        "caption": getattr(action, 'element', navigation_step.thought[:50]),
-                        "element_id": 0,
-                    }
-                    elements.append(element)
-                    print(f"  Detected 1 element (fallback mode): {element['caption'][:30]}...")
-                    return elements
+            # Higher confidence for comprehensive analysis
+            element = self._element_from_action(navigation_step, confidence=0.80)
+            if element is not None:
+                elements.append(element)
+                print(f"  Detected 1 element (fallback mode): {element['caption'][:30]}...")
+                return elements
 
             # If we got here, model didn't return elements in expected format
             print(f"  ⚠ No elements extracted from model response (action: {action.action})")
@@ -699,6 +1402,37 @@ Example for security dialog:
             print(f"  ✗ Comprehensive detection failed: {str(e)}")
             return []
 
+    @staticmethod
+    def _element_from_action(
+        navigation_step: NavigationStep,
+        confidence: float,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Wrap a coordinate action (click_element, write_element...) as a single element.
+
+        Args:
+            navigation_step: Parsed NavigationStep (coordinates already scaled)
+            confidence: Confidence to assign
+
+        Returns:
+            Element dict, or None if the action carries no coordinates
+        """
+        action = navigation_step.action
+        x = getattr(action, 'x', None)
+        y = getattr(action, 'y', None)
+        if x is None or y is None:
+            return None
+
+        caption = getattr(action, 'element', None)
+        return {
+            "bbox": [x - 20, y - 20, 40, 40],
+            "center": [x, y],
+            "confidence": confidence,
+            "type": "clickable",
+            "caption": caption if caption is not None else navigation_step.thought[:50],
+            "element_id": 0,
+        }
+
     def _parse_element_list_from_answer(
         self,
         answer_content: str,
@@ -720,101 +1454,64 @@ Example for security dialog:
         Returns:
             List of detected elements with type, coordinates, description
         """
-        import re
+        points: List[Tuple[int, int]] = []
+        types: List[str] = []
+        captions: List[str] = []
 
-        elements = []
+        normalize_type = self._normalize_element_type
+
+        # Single scan over the whole answer; each match is one element line
+        for match in _ELEMENT_LINE_RE.finditer(answer_content):
+            if len(points) >= max_detections:
+                break
 
-        # Strategy 1: Line-by-line numbered list format (PREFERRED)
-        # Pattern: "1. Button at (123, 456): Install button"
-        # Group 1: optional element type, Group 2-3: coordinates, Group 4: description
-        pattern1 = r'^\s*\d+\.\s*(?:([A-Za-z]+)\s+)?at\s+\((\d+),\s*(\d+)\)\s*:\s*(.+)$'
-
-        # Strategy 2: Element type before coordinates
-        # Pattern: "Button at (123, 456): Install"
-        pattern2 = r'^\s*([A-Za-z]+)\s+at\s+\((\d+),\s*(\d+)\)\s*:\s*(.+)$'
-
-        # Strategy 3: Coordinate-first format
-        # Pattern: "(123, 456) - Button: Install"
-        pattern3 = r'^\s*\((\d+),\s*(\d+)\)\s*[-:]\s*(?:([A-Za-z]+)\s*:\s*)?(.+)$'
-
-        # Try line-by-line parsing with all patterns
-        for line in answer_content.split('\n'):
-            line = line.strip()
-            if not line or len(elements) >= max_detections:
-                continue
-
-            element_type = None
-            x = None
-            y = None
-            description = None
-
-            # Try pattern 1: "1. Button at (123, 456): Install button"
-            match = re.match(pattern1, line)
-            if match:
-                element_type = match.group(1) or "interactive"
-                x = int(match.group(2))
-                y = int(match.group(3))
-                description = match.group(4).strip()
+            (numbered_type, unnumbered_type, x_str, y_str, description,
+             first_x_str, first_y_str, first_type, first_description) = match.groups()
+
+            if x_str is not None:
+                # Patterns 1+2: "1. Button at (123, 456): Install button" / "Button at (123, 456): Install"
+                element_type = numbered_type or unnumbered_type or "interactive"
             else:
-                # Try pattern 2: "Button at (123, 456): Install"
-                match = re.match(pattern2, line)
-                if match:
-                    element_type = match.group(1) or "interactive"
-                    x = int(match.group(2))
-                    y = int(match.group(3))
-                    description = match.group(4).strip()
-                else:
-                    # Try pattern 3: "(123, 456) - Button: Install"
-                    match = re.match(pattern3, line)
-                    if match:
-                        x = int(match.group(1))
-                        y = int(match.group(2))
-                        element_type = match.group(3) or "interactive"
-                        description = match.group(4).strip()
-
-            # If we got coordinates, create element
-            if x is not None and y is not None:
-                elements.append({
-                    "bbox": [x - 20, y - 20, 40, 40],
-                    "center": [x, y],
-                    "confidence": 0.80,  # Higher confidence for structured parsing
-                    "type": self._normalize_element_type(element_type) if element_type else "clickable",
-                    "caption": description[:50] if description else f"Element {len(elements) + 1}",
-                    "element_id": len(elements),
-                })
+                # Pattern 3: "(123, 456) - Button: Install"
+                x_str, y_str, description = first_x_str, first_y_str, first_description
+                element_type = first_type or "interactive"
+
+            points.append((int(x_str), int(y_str)))
+            types.append(normalize_type(element_type))
+            captions.append(description[:50])
+
+        if points:
+            # Higher confidence for structured parsing
+            return _make_elements(points, types, captions, confidence=0.80)
 
         # Fallback: Original coordinate pattern matching (if no line-by-line matches)
-        if not elements:
-            print(f"  No structured elements found, trying fallback coordinate extraction...")
-            coord_pattern = r'\((\d+),\s*(\d+)\)'
-            matches = re.finditer(coord_pattern, answer_content)
-
-            for idx, match in enumerate(matches):
-                if idx >= max_detections:
-                    break
-
-                x = int(match.group(1))
-                y = int(match.group(2))
-
-                # Extract description from surrounding text
-                start_pos = match.end()
-                description_text = answer_content[start_pos:start_pos + 80].strip()
-                description = description_text.split('\n')[0]
-                description = re.sub(r'^[\s\-:,]+', '', description)
-                description = description[:50] if description else f"Element {idx + 1}"
-
-                elements.append({
-                    "bbox": [x - 20, y - 20, 40, 40],
-                    "center": [x, y],
-                    "confidence": 0.70,  # Lower confidence for fallback
-                    "type": "clickable",
-                    "caption": description,
-                    "element_id": idx,
-                })
-
-        return elements
-
-    def _normalize_element_type(self, type_str: str) -> str:
+        print(f"  No structured elements found, trying fallback coordinate extraction...")
+        matches = _COORD_PAIR_RE.finditer(answer_content)
+
+        for idx, match in enumerate(matches):
+            if idx >= max_detections:
+                break
+
+            x = int(match.group(1))
+            y = int(match.group(2))
+
+            # Extract description from surrounding text
+            start_pos = match.end()
+            description_text = answer_content[start_pos:start_pos + 80].strip()
+            description = description_text.split('\n')[0]
+            description = _LEADING_SEPARATORS_RE.sub('', description)
+            description = description[:50] if description else f"Element {idx + 1}"
+
+            points.append((x, y))
+            types.append("clickable")
+            captions.append(description)
+
+        # Lower confidence for fallback
+        return _make_elements(points, types, captions, confidence=0.70)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _normalize_element_type(type_str: str) -> str:
         """
         Normalize element type strings to standard categories.
 
@@ -829,6 +1526,10 @@ Example for security dialog:
 
         type_lower = type_str.lower().strip()
 
+        alias = _ELEMENT_TYPE_ALIASES.get(type_lower)
+        if alias is not None:
+            return alias
+
         if 'button' in type_lower or 'btn' in type_lower:
             return 'button'
         elif 'input' in type_lower or 'field' in type_lower or 'textbox' in type_lower or 'text' in type_lower:
@@ -852,6 +1553,7 @@ Example for security dialog:
         self,
         image: Image.Image,
         elements: List[Dict[str, Any]],
+        in_place: bool = False,
     ) -> str:
         """
         Generate Set-of-Mark annotated image with numbered bounding boxes.
@@ -861,21 +1563,16 @@ Example for security dialog:
         Args:
             image: PIL Image
             elements: List of detected elements with 'center' and 'bbox'
+            in_place: Draw directly on `image` instead of a copy (caller owns a scratch image)
 
         Returns:
-            Base64 encoded PNG image with SOM annotations
+            Base64 encoded image (settings.som_image_format, PNG by default) with SOM annotations
         """
-        from PIL import ImageDraw, ImageFont
-
-        # Create a copy to draw on
-        annotated = image.copy()
+        # Create a copy to draw on (skip the full-frame copy for scratch images)
+        annotated = image if in_place else image.copy()
         draw = ImageDraw.Draw(annotated)
 
-        # Try to load a font, fall back to default if unavailable
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 16)
-        except:
-            font = ImageFont.load_default()
+        font = _get_som_font()
 
         for idx, element in enumerate(elements):
             # Get bounding box
@@ -915,17 +1612,23 @@ Example for security dialog:
                     font=font,
                 )
 
-        # Convert to base64
-        buffered = io.BytesIO()
-        annotated.save(buffered, format="PNG")
-        img_bytes = buffered.getvalue()
-        img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+        # Convert to base64 (encode straight from the buffer, no bytes copy)
+        buffered = _get_encode_buffer()
+        image_format = settings.som_image_format.upper()
+        if image_format == "PNG":
+            annotated.save(buffered, format="PNG")
+        else:
+            if image_format == "JPEG" and annotated.mode != "RGB":
+                annotated = annotated.convert("RGB")
+            annotated.save(buffered, format=image_format, quality=settings.som_image_quality)
+        with buffered.getbuffer() as img_bytes:
+            img_base64 = b64encode(img_bytes).decode('ascii')
 
         return img_base64
 
     def parse_screenshot(
         self,
-        image_array: np.ndarray,
+        image_array: Union[np.ndarray, Image.Image],
         task: Optional[str] = None,
         detect_multiple: bool = True,
         include_som: bool = True,
@@ -933,6 +1636,7 @@ Example for security dialog:
         min_confidence: Optional[float] = None,
         return_raw_outputs: Optional[bool] = None,
         performance_profile: Optional[str] = None,
+        scratch_image: bool = False,
     ) -> Dict[str, Any]:
         """
         Parse UI screenshot using Holo 1.5-7B transformers (backward compatible).
@@ -942,7 +1646,7 @@ Example for security dialog:
         2. Multi-element mode (detect_multiple=True): Detect multiple elements
 
         Args:
-            image_array: Input screenshot as numpy array (RGB)
+            image_array: Input screenshot as numpy array or PIL Image (RGB)
             task: Optional specific task instruction (single element mode)
             detect_multiple: Whether to detect multiple elements (default: True)
             include_som: Whether to generate Set-of-Mark annotated image
@@ -950,6 +1654,7 @@ Example for security dialog:
             min_confidence: Optional confidence floor (ignored for transformers)
             return_raw_outputs: Whether to include raw outputs (not implemented)
             performance_profile: Optional profile (speed/balanced/quality)
+            scratch_image: Caller won't reuse `image_array`, so SOM may draw on it directly
 
         Returns:
             Dictionary with detected elements and metadata (old format)
@@ -966,48 +1671,85 @@ Example for security dialog:
         parse_status = 'success'
         parse_error = None
 
-        if task:
+        # Convert once; inference and SOM rendering share the same PIL image
+        pil_image = _to_pil_image(image_array)
+        # Only an image converted here or handed over as scratch may be drawn on
+        owns_image = scratch_image or pil_image is not image_array
+
+        # Hash the screenshot once; the result, preprocessing and vision caches share it
+        image_key = None
+        if (
+            settings.result_cache_size > 0
+            or settings.image_cache_size > 0
+            or self._vision_encoder is not None
+        ):
+            image_key = _image_digest(pil_image)
+
+        # Identical screenshot + request (e.g. agent retries): reuse the detections
+        result_key = None
+        cached_result = None
+        if settings.result_cache_size > 0:
+            result_key = (image_key, task, detect_multiple, effective_max)
+            cached_result = self._result_cache.get(result_key)
+
+        if cached_result is not None:
+            self._result_cache.move_to_end(result_key)
+            cached_elements, raw_output, parse_status, parse_error = cached_result
+            # Copies: callers may mutate the returned elements and their bbox/center lists
+            elements = _copy_elements(cached_elements)
+            print(f"  Result cache hit ({len(elements)} elements)")
+
+        elif task:
             # Single element mode: localize specific task
             print(f"  Single-element mode: task='{task}'")
             navigation_step, timing_data = self.navigate(
-                image_array=image_array,
+                image_array=pil_image,
                 task=task,
                 step=1,
+                image_key=image_key,
             )
 
             raw_output = timing_data.get('raw_output')
             parse_status = timing_data.get('parse_status', 'success')
             parse_error = timing_data.get('parse_error')
 
-            action = navigation_step.action
-
             # Only create element if action has coordinates
-            if hasattr(action, 'x') and hasattr(action, 'y'):
-                if action.x is not None and action.y is not None:
-                    element = {
-                        "bbox": [action.x - 20, action.y - 20, 40, 40],
-                        "center": [action.x, action.y],
-                        "confidence": 0.85,
-                        "type": "clickable",
-                        "caption": getattr(action, 'element', navigation_step.thought[:50]),
-                        "element_id": 0,
-                    }
-                    elements.append(element)
+            element = self._element_from_action(navigation_step, confidence=0.85)
+            if element is not None:
+                elements.append(element)
 
         elif detect_multiple:
             # Multi-element mode: run multiple detection prompts
             print(f"  Multi-element mode: max_detections={effective_max}")
             elements = self.detect_multiple_elements(
-                image_array,
+                pil_image,
                 max_detections=effective_max,
+                image_key=image_key,
+            )
+
+        # Only cache successful detections: an empty list may come from a swallowed
+        # inference error (e.g. CUDA OOM) and must not stick for later retries
+        if (
+            result_key is not None
+            and cached_result is None
+            and elements
+            and parse_status == 'success'
+            and not parse_error
+        ):
+            self._result_cache[result_key] = (
+                _copy_elements(elements),
+                raw_output,
+                parse_status,
+                parse_error,
             )
+            while len(self._result_cache) > settings.result_cache_size:
+                self._result_cache.popitem(last=False)
 
         # Generate SOM annotated image if requested
         som_image = None
         if include_som and elements:
             print(f"  Generating SOM image with {len(elements)} elements...")
-            pil_image = Image.fromarray(np.uint8(image_array))
-            som_image = self.generate_som_image(pil_image, elements)
+            som_image = self.generate_som_image(pil_image, elements, in_place=owns_image)
 
         processing_time = (time.time() - start_time) * 1000  # Convert to ms
 
@@ -1021,7 +1763,7 @@ Example for security dialog:
             "elements": elements,
             "count": len(elements),
             "processing_time_ms": round(processing_time, 2),
-            "image_size": {"width": image_array.shape[1], "height": image_array.shape[0]},
+            "image_size": {"width": pil_image.width, "height": pil_image.height},
             "device": self.device,
             "profile": profile_key,
             "max_detections": effective_max,
@@ -1047,6 +1789,7 @@ Example for security dialog:
 
         if som_image:
             result["som_image"] = som_image
+            result["som_image_format"] = settings.som_image_format
 
         return result
 
@@ -1,19 +1,32 @@
 """FastAPI server for Holo 1.5-7B UI navigation service (transformers)."""
 
 import io
-import base64
 import time
-from typing import Optional, Dict, Any
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable
 from contextlib import asynccontextmanager
-import numpy as np
 from PIL import Image
-from fastapi import FastAPI, File, UploadFile, HTTPException, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body, Query
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 import uvicorn
 import torch
 
+try:
+    from pybase64 import b64decode  # Optional: SIMD (AVX2/NEON) base64 codec
+except ImportError:
+    from base64 import b64decode
+
+try:
+    import orjson  # noqa: F401  Optional: Rust JSON encoder for response bodies
+    _default_response_class = ORJSONResponse
+except ImportError:
+    _default_response_class = JSONResponse
+
 from .config import settings, NavigationStep, ActionSpace
 from .holo_wrapper import get_model
 
@@ -86,6 +99,7 @@ class ParseResponse(BaseModel):
     max_detections: Optional[int] = Field(None, description="Effective detection cap used")
     min_confidence: Optional[float] = Field(None, description="Confidence threshold applied")
     som_image: Optional[str] = Field(None, description="Base64 encoded Set-of-Mark annotated image")
+    som_image_format: Optional[str] = Field(None, description="Encoding of som_image: png, jpeg or webp")
     model: str = Field("holo-1.5-7b-transformers", description="Source model identifier")
     timing: Optional[dict[str, float]] = Field(None, description="Detailed timing breakdown")
     raw_output: Optional[str] = Field(None, description="Raw model output (debug mode only)")
@@ -190,6 +204,7 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     print("Shutting down Holo 1.5-7B service...")
+    _inference_executor.shutdown(wait=False)
 
 
 # Create FastAPI app
@@ -197,7 +212,9 @@ app = FastAPI(
     title="Bytebot Holo 1.5-7B Navigation Service",
     description="Official transformers-based Holo 1.5-7B for UI navigation and localization",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serializes the multi-MB base64 som_image field far faster than stdlib json
+    default_response_class=_default_response_class,
 )
 
 # Add CORS middleware
@@ -210,15 +227,57 @@ app.add_middleware(
 )
 
 
-def decode_image(image_data: str) -> np.ndarray:
+# Single worker keeps model calls serialized (one GPU model instance), while
+# image decoding runs on the default threadpool so request N+1 can be decoded
+# during inference of request N without blocking the event loop
+_inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="holo-inference")
+
+
+async def run_on_inference_worker(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking model call on the dedicated inference thread."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _inference_executor,
+        functools.partial(func, *args, **kwargs),
+    )
+
+
+def decode_image_bytes(image_bytes: bytes) -> Image.Image:
     """
-    Decode base64 image to numpy array.
+    Decode raw encoded image bytes (PNG, JPEG, ...) to an RGB PIL Image.
+
+    The decoded PIL image is handed to the model as-is; converting to numpy
+    here only for the wrapper to convert straight back would copy the full
+    frame twice per request.
+
+    Args:
+        image_bytes: Encoded image file contents
+
+    Returns:
+        RGB PIL Image (pixels loaded)
+    """
+    # Open with PIL
+    image = Image.open(io.BytesIO(image_bytes))
+
+    # Convert to RGB if needed
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    else:
+        # Decode now so corrupt data fails here rather than during inference
+        image.load()
+
+    return image
+
+
+def decode_image(image_data: str) -> Image.Image:
+    """
+    Decode base64 image to an RGB PIL Image.
 
     Args:
         image_data: Base64 encoded image string
 
     Returns:
-        RGB numpy array
+        RGB PIL Image
     """
     try:
         # Remove data URL prefix if present
@@ -226,17 +285,7 @@ def decode_image(image_data: str) -> np.ndarray:
             image_data = image_data.split(",", 1)[1]
 
         # Decode base64
-        image_bytes = base64.b64decode(image_data)
-
-        # Open with PIL
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # Convert to RGB if needed
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-
-        # Convert to numpy array
-        return np.array(image)
+        return decode_image_bytes(b64decode(image_data))
 
     except Exception as e:
         raise HTTPException(
@@ -296,10 +345,11 @@ async def gpu_info():
 
     if torch.cuda.is_available() and settings.device == "cuda":
         gpu_name = torch.cuda.get_device_name(0)
-        props = torch.cuda.get_device_properties(0)
-        total_bytes = props.total_memory
-        used_bytes = torch.cuda.memory_allocated(0)
-        free_bytes = total_bytes - used_bytes
+        # Device-wide free/total straight from the driver (cudaMemGetInfo) -
+        # in-process, no nvidia-smi subprocess, and includes the caching
+        # allocator's reserved blocks and other processes
+        free_bytes, total_bytes = torch.cuda.mem_get_info(0)
+        used_bytes = total_bytes - free_bytes
 
         memory_total_mb = int(total_bytes / (1024 ** 2))
         memory_used_mb = int(used_bytes / (1024 ** 2))
@@ -336,14 +386,15 @@ async def navigate(request: NavigateRequest = Body(...)):
         print(f"→ Navigate request: task='{request.task}', step={request.step}")
 
         # Decode image
-        image = decode_image(request.image)
-        print(f"  Image decoded: {image.shape[1]}x{image.shape[0]} pixels")
+        image = await run_in_threadpool(decode_image, request.image)
+        print(f"  Image decoded: {image.width}x{image.height} pixels")
 
         # Get model
         model = get_model()
 
         # Run navigation
-        navigation_step, timing_data = model.navigate(
+        navigation_step, timing_data = await run_on_inference_worker(
+            model.navigate,
             image_array=image,
             task=request.task,
             step=request.step,
@@ -357,7 +408,7 @@ async def navigate(request: NavigateRequest = Body(...)):
             "thought": navigation_step.thought,
             "action": navigation_step.action.model_dump(),  # Pydantic v2
             "processing_time_ms": processing_time_ms,
-            "image_size": {"width": image.shape[1], "height": image.shape[0]},
+            "image_size": {"width": image.width, "height": image.height},
             "device": settings.device,
         }
 
@@ -381,6 +432,42 @@ async def navigate(request: NavigateRequest = Body(...)):
         raise HTTPException(status_code=500, detail=f"Navigation error: {str(e)}")
 
 
+async def _parse_image(
+    image: Image.Image,
+    task: Optional[str] = None,
+    detect_multiple: bool = True,
+    include_som: bool = True,
+    max_detections: Optional[int] = None,
+    min_confidence: Optional[float] = None,
+    return_raw_outputs: bool = False,
+    performance_profile: Optional[str] = None,
+) -> ParseResponse:
+    """Run Holo 1.5-7B parse_screenshot on an already decoded image."""
+    print(f"  Image decoded: {image.width}x{image.height} pixels")
+
+    # Get model
+    model = get_model()
+
+    # Use Holo 1.5-7B parse_screenshot (backward compatible)
+    result = await run_on_inference_worker(
+        model.parse_screenshot,
+        image,
+        task=task,
+        detect_multiple=detect_multiple,
+        include_som=include_som,
+        max_detections=max_detections,
+        min_confidence=min_confidence,
+        return_raw_outputs=return_raw_outputs,
+        performance_profile=performance_profile,
+        # Freshly decoded per request, so SOM can annotate it without a copy
+        scratch_image=True,
+    )
+
+    result["model"] = "holo-1.5-7b-transformers"
+
+    return ParseResponse(**result)
+
+
 @app.post("/parse", response_model=ParseResponse)
 async def parse_screenshot(request: ParseRequest = Body(...)):
     """
@@ -404,14 +491,9 @@ async def parse_screenshot(request: ParseRequest = Body(...)):
               f"max_detections={request.max_detections or 'default'}")
 
         # Decode image
-        image = decode_image(request.image)
-        print(f"  Image decoded: {image.shape[1]}x{image.shape[0]} pixels")
-
-        # Get model
-        model = get_model()
+        image = await run_in_threadpool(decode_image, request.image)
 
-        # Use Holo 1.5-7B parse_screenshot (backward compatible)
-        result = model.parse_screenshot(
+        return await _parse_image(
             image,
             task=request.task,
             detect_multiple=request.detect_multiple,
@@ -422,10 +504,6 @@ async def parse_screenshot(request: ParseRequest = Body(...)):
             performance_profile=request.performance_profile,
         )
 
-        result["model"] = "holo-1.5-7b-transformers"
-
-        return ParseResponse(**result)
-
     except HTTPException:
         raise
     except Exception as e:
@@ -461,14 +539,14 @@ async def detect_dialog(request: DialogDetectionRequest = Body(...)):
         print(f"→ Dialog detection request")
 
         # Decode image
-        image = decode_image(request.image)
-        print(f"  Image decoded: {image.shape[1]}x{image.shape[0]} pixels")
+        image = await run_in_threadpool(decode_image, request.image)
+        print(f"  Image decoded: {image.width}x{image.height} pixels")
 
         # Get model
         model = get_model()
 
         # Run dialog detection
-        result = model.detect_modal_dialog(image)
+        result = await run_on_inference_worker(model.detect_modal_dialog, image)
 
         # Calculate processing time
         processing_time_ms = (time.time() - start_time) * 1000
@@ -509,8 +587,8 @@ async def parse_upload(
     task: Optional[str] = None,
     detect_multiple: bool = True,
     include_som: bool = True,
-    max_detections: Optional[int] = None,
-    min_confidence: Optional[float] = None,
+    max_detections: Optional[int] = Query(None, ge=1, le=200),
+    min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
     performance_profile: Optional[str] = None,
 ):
     """
@@ -531,13 +609,16 @@ async def parse_upload(
     try:
         # Read image file
         image_bytes = await file.read()
+        print(f"→ Parse upload request: task={'Yes' if task else 'No'}, "
+              f"detect_multiple={detect_multiple}, "
+              f"profile={performance_profile or 'balanced'}, "
+              f"max_detections={max_detections or 'default'}")
 
-        # Encode to base64
-        image_b64 = base64.b64encode(image_bytes).decode('utf-8')
+        # Decode the uploaded bytes directly (no base64 round-trip)
+        image = await run_in_threadpool(decode_image_bytes, image_bytes)
 
-        # Call main parse endpoint
-        request = ParseRequest(
-            image=image_b64,
+        return await _parse_image(
+            image,
             task=task,
             detect_multiple=detect_multiple,
             include_som=include_som,
@@ -545,7 +626,6 @@ async def parse_upload(
             min_confidence=min_confidence,
             performance_profile=performance_profile,
         )
-        return await parse_screenshot(request)
 
     except Exception as e:
         print(f"✗ Upload parse error: {str(e)}")
@@ -0,0 +1,44 @@
+"""Shared fixtures for the Holo wrapper tests (no model weights or GPU needed)."""
+
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("pydantic_settings")
+
+from src import holo_wrapper  # noqa: E402
+from src.config import settings  # noqa: E402
+
+
+@pytest.fixture
+def cache_settings(monkeypatch):
+    """Pin the cache-related settings so tests don't depend on the environment."""
+    monkeypatch.setattr(settings, "image_cache_size", 2)
+    monkeypatch.setattr(settings, "result_cache_size", 2)
+    monkeypatch.setattr(settings, "som_image_format", "png")
+    return settings
+
+
+@pytest.fixture
+def bare_model():
+    """
+    Holo15 instance without __init__ (no weights), with empty caches on CPU.
+
+    Tests attach whatever fake processor/model attributes the method under
+    test needs.
+    """
+    model = object.__new__(holo_wrapper.Holo15)
+    model.device = "cpu"
+    model.model = SimpleNamespace(device="cpu")
+    model._vision_encoder = None
+    model._pixel_scale = None
+    model._pixel_shift = None
+    model._image_inputs_cache = OrderedDict()
+    model._prompt_text_cache = OrderedDict()
+    model._prompt_ids_cache = OrderedDict()
+    model._result_cache = OrderedDict()
+    return model
@@ -0,0 +1,290 @@
+"""Tests for cache keys and LRU eviction in the Holo wrapper (CPU only, no weights)."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers.models.qwen2_vl.image_processing_qwen2_vl import Qwen2VLImageProcessor
+
+from src.config import NavigationStep, ClickElementAction, AnswerAction
+from src.holo_wrapper import _CachedVisionEncoder, _image_digest, _message_signature
+
+
+def _image(seed: int, size=(84, 56)) -> Image.Image:
+    pixels = np.random.RandomState(seed).randint(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+class _CountingImageProcessor:
+    """Wraps the real Qwen2-VL image processor and counts preprocessing calls."""
+
+    def __init__(self):
+        self.inner = Qwen2VLImageProcessor()
+        self.calls = 0
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.inner(*args, **kwargs)
+
+
+class _CountingEncoder(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.marker = "tower"
+
+    def forward(self, hidden_states, grid_thw=None):
+        self.calls += 1
+        return hidden_states * 2
+
+
+# ---------------------------------------------------------------------------
+# Cache keys
+# ---------------------------------------------------------------------------
+
+def test_image_digest_depends_on_pixels_size_and_mode():
+    image = _image(0)
+
+    assert _image_digest(image) == _image_digest(image.copy())
+    assert _image_digest(image) != _image_digest(_image(1))
+    assert _image_digest(image) != _image_digest(image.convert("RGBA"))
+    assert _image_digest(Image.new("RGB", (4, 2))) != _image_digest(Image.new("RGB", (2, 4)))
+
+
+def test_message_signature_ignores_images_but_not_text():
+    def messages(image, text):
+        return [
+            {"role": "system", "content": [{"type": "text", "text": "sys"}]},
+            {"role": "user", "content": [{"type": "image", "image": image}, {"type": "text", "text": text}]},
+        ]
+
+    assert _message_signature(messages(_image(0), "task")) == _message_signature(messages(_image(1), "task"))
+    assert _message_signature(messages(_image(0), "task")) != _message_signature(messages(_image(0), "other"))
+    hash(_message_signature(messages(_image(0), "task")))
+
+
+# ---------------------------------------------------------------------------
+# Preprocessing / prompt caches
+# ---------------------------------------------------------------------------
+
+def test_image_inputs_cache_hits_and_evicts_lru(bare_model, cache_settings):
+    image_processor = _CountingImageProcessor()
+    bare_model.processor = SimpleNamespace(image_processor=image_processor)
+    first, second, third = _image(0), _image(1), _image(2)
+
+    cached_first = bare_model._get_image_inputs(first)
+    assert bare_model._get_image_inputs(first.copy()) is cached_first
+    assert image_processor.calls == 1
+
+    bare_model._get_image_inputs(second)
+    bare_model._get_image_inputs(first)  # refresh: second becomes least recent
+    bare_model._get_image_inputs(third)  # evicts second (image_cache_size=2)
+
+    assert list(bare_model._image_inputs_cache) == [_image_digest(first), _image_digest(third)]
+    assert image_processor.calls == 3
+
+
+def test_image_inputs_cache_uses_precomputed_key(bare_model, cache_settings):
+    bare_model.processor = SimpleNamespace(image_processor=_CountingImageProcessor())
+
+    bare_model._get_image_inputs(_image(0), image_key=b"request-digest")
+
+    assert list(bare_model._image_inputs_cache) == [b"request-digest"]
+
+
+def test_image_inputs_cache_disabled(bare_model, cache_settings, monkeypatch):
+    monkeypatch.setattr(cache_settings, "image_cache_size", 0)
+    image_processor = _CountingImageProcessor()
+    bare_model.processor = SimpleNamespace(image_processor=image_processor)
+
+    bare_model._get_image_inputs(_image(0))
+    bare_model._get_image_inputs(_image(0))
+
+    assert image_processor.calls == 2
+    assert not bare_model._image_inputs_cache
+
+
+def test_render_chat_template_is_cached_per_prompt(bare_model):
+    rendered = []
+
+    def apply_chat_template(messages, tokenize, add_generation_prompt):
+        rendered.append(messages)
+        return f"rendered:{messages[-1]['content'][-1]['text']}"
+
+    bare_model.processor = SimpleNamespace(apply_chat_template=apply_chat_template)
+
+    def messages(image, text):
+        return [{"role": "user", "content": [{"type": "image", "image": image}, {"type": "text", "text": text}]}]
+
+    assert bare_model._render_chat_template(messages(_image(0), "a")) == "rendered:a"
+    assert bare_model._render_chat_template(messages(_image(1), "a")) == "rendered:a"
+    assert bare_model._render_chat_template(messages(_image(0), "b")) == "rendered:b"
+    assert len(rendered) == 2
+
+
+def test_prepare_inputs_splices_image_tokens_and_caches_prompt_ids(bare_model, cache_settings):
+    vocab = {"<user>": 1, "<|image_pad|>": 9, "find": 2, "button": 3}
+    tokenized = []
+
+    def tokenizer(texts, return_tensors=None, padding=False):
+        tokenized.append(texts[0])
+        return {"input_ids": torch.tensor([[vocab[token] for token in texts[0].split()]])}
+
+    tokenizer.convert_tokens_to_ids = vocab.__getitem__
+    bare_model.processor = SimpleNamespace(
+        image_processor=_CountingImageProcessor(),
+        image_token="<|image_pad|>",
+        tokenizer=tokenizer,
+    )
+    prompt = "<user> <|image_pad|> find button"
+    image = _image(0)  # 84x56 -> grid (1, 4, 6) -> 24 patches / merge 4 = 6 tokens
+
+    inputs = bare_model._prepare_inputs(prompt, image)
+    again = bare_model._prepare_inputs(prompt, image)
+
+    assert inputs["input_ids"].tolist() == [[1] + [9] * 6 + [2, 3]]
+    assert inputs["attention_mask"].tolist() == [[1] * 9]
+    assert inputs["image_grid_thw"].tolist() == [[1, 4, 6]]
+    assert torch.equal(again["input_ids"], inputs["input_ids"])
+    assert tokenized == [prompt]
+
+
+# ---------------------------------------------------------------------------
+# On-device normalization
+# ---------------------------------------------------------------------------
+
+def test_pixel_affine_matches_processor_normalization(bare_model, cache_settings):
+    image_processor = Qwen2VLImageProcessor()
+    bare_model.processor = SimpleNamespace(image_processor=image_processor)
+    image = _image(3)
+
+    scale, shift = bare_model._build_pixel_affine()
+    raw = image_processor(images=[image], do_resize=False, do_rescale=False, do_normalize=False, return_tensors="pt")
+    reference = image_processor(images=[image], do_resize=False, return_tensors="pt")
+
+    assert raw["pixel_values"].dtype == torch.uint8
+    normalized = torch.addcmul(shift, raw["pixel_values"].float(), scale)
+    torch.testing.assert_close(normalized, reference["pixel_values"], rtol=1e-5, atol=1e-5)
+
+
+# ---------------------------------------------------------------------------
+# Vision tower cache
+# ---------------------------------------------------------------------------
+
+def test_cached_vision_encoder_memoizes_per_key_and_evicts():
+    encoder = _CountingEncoder()
+    cached = _CachedVisionEncoder(encoder, max_entries=2)
+    pixels = torch.ones(2, 3)
+
+    cached(pixels)
+    cached(pixels)
+    assert encoder.calls == 2  # no key: passthrough
+
+    for key in (b"a", b"a", b"b", b"c", b"a"):
+        cached.cache_key = key
+        cached(pixels)
+    assert encoder.calls == 6  # a, b, c, then a again after eviction
+    assert list(cached._cache) == [b"c", b"a"]
+    assert cached.marker == "tower"
+
+    cached.clear()
+    assert not cached._cache
+
+
+# ---------------------------------------------------------------------------
+# parse_screenshot result cache
+# ---------------------------------------------------------------------------
+
+def _click_step(x=40, y=50):
+    return NavigationStep(
+        note="",
+        thought="",
+        action=ClickElementAction(action="click_element", element="OK button", x=x, y=y),
+    )
+
+
+def _stub_navigate(bare_model, steps):
+    calls = []
+
+    def navigate(image_array, task, step=1, image_key=None):
+        calls.append(image_key)
+        return steps.pop(0), {"parse_status": "success"}
+
+    bare_model.navigate = navigate
+    return calls
+
+
+def test_parse_screenshot_caches_successful_results(bare_model, cache_settings):
+    calls = _stub_navigate(bare_model, [_click_step()])
+    image = _image(0, size=(200, 100))
+
+    first = bare_model.parse_screenshot(image, task="click OK", include_som=False)
+    first["elements"][0]["caption"] = "mutated by caller"
+    first["elements"][0]["center"][0] = -1
+    first["elements"][0]["bbox"].append(0)
+    second = bare_model.parse_screenshot(image.copy(), task="click OK", include_som=False)
+
+    assert len(calls) == 1
+    assert calls[0] == _image_digest(image)
+    assert second["elements"][0]["caption"] == "OK button"
+    assert second["elements"][0]["center"] == [40, 50]
+    assert second["elements"][0]["bbox"] == [20, 30, 40, 40]
+
+
+def test_parse_screenshot_does_not_cache_empty_results(bare_model, cache_settings):
+    empty = NavigationStep(note="", thought="", action=AnswerAction(action="answer", content="Error: oom"))
+    calls = _stub_navigate(bare_model, [empty, _click_step()])
+    image = _image(0, size=(200, 100))
+
+    assert bare_model.parse_screenshot(image, task="click OK", include_som=False)["count"] == 0
+    assert bare_model.parse_screenshot(image, task="click OK", include_som=False)["count"] == 1
+    assert len(calls) == 2
+
+
+def test_parse_screenshot_result_cache_evicts_lru(bare_model, cache_settings):
+    _stub_navigate(bare_model, [_click_step() for _ in range(3)])
+
+    for seed in range(3):
+        bare_model.parse_screenshot(_image(seed, size=(200, 100)), task="click OK", include_som=False)
+
+    assert [key[0] for key in bare_model._result_cache] == [
+        _image_digest(_image(1, size=(200, 100))),
+        _image_digest(_image(2, size=(200, 100))),
+    ]
+
+
+def test_parse_screenshot_som_leaves_caller_image_untouched(bare_model, cache_settings):
+    _stub_navigate(bare_model, [_click_step()])
+    image = Image.new("RGB", (200, 100), "white")
+    before = image.tobytes()
+
+    result = bare_model.parse_screenshot(image, task="click OK", include_som=True)
+
+    assert result["som_image"]
+    assert image.tobytes() == before
+
+
+def test_parse_screenshot_som_draws_on_scratch_image(bare_model, cache_settings):
+    _stub_navigate(bare_model, [_click_step()])
+    image = Image.new("RGB", (200, 100), "white")
+    before = image.tobytes()
+
+    result = bare_model.parse_screenshot(image, task="click OK", include_som=True, scratch_image=True)
+
+    assert result["som_image"]
+    assert image.tobytes() != before
+
+
+def test_parse_screenshot_accepts_ndarray(bare_model, cache_settings):
+    _stub_navigate(bare_model, [_click_step()])
+    pixels = np.full((100, 200, 3), 255, dtype=np.uint8)
+
+    result = bare_model.parse_screenshot(pixels, task="click OK", include_som=True)
+
+    assert result["image_size"] == {"width": 200, "height": 100}
+    assert result["som_image_format"] == "png"
+    assert np.all(pixels == 255)
@@ -0,0 +1,173 @@
+"""Tests for model-output parsing: element lists, JSON extraction, JSON stopping."""
+
+import pytest
+import torch
+
+from src.holo_wrapper import (
+    Holo15,
+    _ELEMENT_LINE_RE,
+    _JsonObjectStoppingCriteria,
+    _extract_json_object,
+)
+
+
+class _CharTokenizer:
+    """Tokenizer stand-in where every token id is one character's code point."""
+
+    def decode(self, token_ids, skip_special_tokens=True):
+        return "".join(chr(token_id) for token_id in token_ids)
+
+
+def _run_stopping(chunks, prompt="prompt"):
+    """Feed generated text chunks through the criterion; return per-step results."""
+    prompt_ids = [ord(char) for char in prompt]
+    criteria = _JsonObjectStoppingCriteria(_CharTokenizer(), len(prompt_ids))
+    generated = list(prompt_ids)
+    results = []
+    for chunk in chunks:
+        generated.extend(ord(char) for char in chunk)
+        input_ids = torch.tensor([generated])
+        results.append(bool(criteria(input_ids, None)[0]))
+    return results
+
+
+# ---------------------------------------------------------------------------
+# _ELEMENT_LINE_RE / _parse_element_list_from_answer
+# ---------------------------------------------------------------------------
+
+def test_element_line_re_matches_all_line_formats():
+    answer = (
+        "1. Button at (123, 456): Install button\n"
+        "Link at (10, 20): Docs  \n"
+        "2. at (5, 6): Untyped\n"
+        "(7, 8) - Icon: Settings\r\n"
+        "(9, 10): Plain\n"
+    )
+    matches = [match.groups() for match in _ELEMENT_LINE_RE.finditer(answer)]
+
+    assert matches == [
+        ("Button", None, "123", "456", "Install button", None, None, None, None),
+        (None, "Link", "10", "20", "Docs", None, None, None, None),
+        (None, None, "5", "6", "Untyped", None, None, None, None),
+        (None, None, None, None, None, "7", "8", "Icon", "Settings"),
+        (None, None, None, None, None, "9", "10", None, "Plain"),
+    ]
+
+
+@pytest.mark.parametrize("answer", [
+    "1. Button at (1,\n2): split across lines",
+    "(1, 2) -   ",
+    "Button at (1, 2):",
+    "prose mentioning Button at (1, 2): mid-line",
+])
+def test_element_line_re_rejects_partial_or_multiline_lines(answer):
+    assert list(_ELEMENT_LINE_RE.finditer(answer)) == []
+
+
+def test_parse_element_list_builds_elements(bare_model):
+    answer = "1. Button at (100, 200): Install\n(30, 40) - Link: Docs\n"
+
+    elements = bare_model._parse_element_list_from_answer(answer, max_detections=10)
+
+    assert elements == [
+        {
+            "bbox": [80, 180, 40, 40],
+            "center": [100, 200],
+            "confidence": 0.80,
+            "type": "button",
+            "caption": "Install",
+            "element_id": 0,
+        },
+        {
+            "bbox": [10, 20, 40, 40],
+            "center": [30, 40],
+            "confidence": 0.80,
+            "type": "link",
+            "caption": "Docs",
+            "element_id": 1,
+        },
+    ]
+
+
+def test_parse_element_list_keeps_out_of_range_coordinates(bare_model):
+    # A coordinate past int32 must not take the other elements down with it
+    answer = "1. Button at (10, 20): OK\n2. Button at (99999999999, 5): Huge\n"
+
+    elements = bare_model._parse_element_list_from_answer(answer, max_detections=10)
+
+    assert [element["center"] for element in elements] == [[10, 20], [99999999999, 5]]
+    assert elements[1]["bbox"] == [99999999979, -15, 40, 40]
+
+def test_parse_element_list_keeps_adjacent_elements(bare_model):
+    # Rows 10px apart are distinct UI elements and must all be returned
+    answer = "\n".join(f"{idx + 1}. Menu at (50, {100 + idx * 10}): Item {idx}" for idx in range(5))
+
+    elements = bare_model._parse_element_list_from_answer(answer, max_detections=10)
+
+    assert [element["center"] for element in elements] == [[50, 100 + idx * 10] for idx in range(5)]
+
+
+def test_parse_element_list_caps_at_max_detections(bare_model):
+    answer = "\n".join(f"{idx + 1}. Button at ({idx * 100}, 10): B{idx}" for idx in range(6))
+
+    elements = bare_model._parse_element_list_from_answer(answer, max_detections=3)
+
+    assert [element["caption"] for element in elements] == ["B0", "B1", "B2"]
+
+
+def test_parse_element_list_falls_back_to_bare_coordinates(bare_model):
+    answer = "Found (10, 20) search box and (30, 40): close"
+
+    elements = bare_model._parse_element_list_from_answer(answer, max_detections=1)
+
+    assert len(elements) == 1
+    assert elements[0]["center"] == [10, 20]
+    assert elements[0]["confidence"] == 0.70
+    assert elements[0]["type"] == "clickable"
+    assert elements[0]["caption"] == "search box and (30, 40): close"
+
+
+def test_normalize_element_type_aliases():
+    assert Holo15._normalize_element_type("Btn") == "button"
+    assert Holo15._normalize_element_type("textbox") == "text_input"
+    assert Holo15._normalize_element_type("something") == "clickable"
+
+
+# ---------------------------------------------------------------------------
+# _extract_json_object
+# ---------------------------------------------------------------------------
+
+@pytest.mark.parametrize("output", [
+    '{"a": 1}',
+    '```json\n{"a": 1}\n```',
+    '```json\n{"a": 1}',
+    'Here you go: {"a": 1} hope that helps',
+])
+def test_extract_json_object_variants(output):
+    assert _extract_json_object(output) == {"a": 1}
+
+
+def test_extract_json_object_without_object_raises():
+    with pytest.raises(ValueError):
+        _extract_json_object("no json here")
+
+
+# ---------------------------------------------------------------------------
+# _JsonObjectStoppingCriteria
+# ---------------------------------------------------------------------------
+
+def test_stopping_criteria_stops_when_top_level_object_closes():
+    assert _run_stopping(['{"a"', ': {"b": 1}', "}", "\n```"]) == [False, False, True, True]
+
+
+def test_stopping_criteria_ignores_braces_inside_strings():
+    assert _run_stopping(['{"text": "}', ' \\" }"', "}"]) == [False, False, True]
+
+
+def test_stopping_criteria_handles_multi_token_steps():
+    # One step can append several tokens (the whole object), e.g. with assisted decoding
+    assert _run_stopping(['```json\n{"x": 1}\n```']) == [True]
+
+
+def test_stopping_criteria_ignores_prompt_braces():
+    assert _run_stopping(["thinking"], prompt='schema {"type": "object"}') == [False]
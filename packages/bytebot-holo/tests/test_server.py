@@ -0,0 +1,58 @@
+"""Tests for request validation in the HTTP API (the model is never loaded)."""
+
+import io
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("fastapi")
+pytest.importorskip("multipart")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src import server  # noqa: E402
+
+
+def _png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("query", [
+    "max_detections=0",
+    "max_detections=201",
+    "max_detections=-5",
+    "min_confidence=-0.1",
+    "min_confidence=1.5",
+])
+def test_parse_upload_rejects_out_of_range_params(monkeypatch, query):
+    async def parse_image(image, **kwargs):
+        raise AssertionError("validation should reject the request first")
+
+    monkeypatch.setattr(server, "_parse_image", parse_image)
+    client = TestClient(server.app)
+
+    response = client.post(f"/parse/upload?{query}", files={"file": ("a.png", _png_bytes(), "image/png")})
+
+    assert response.status_code == 422
+
+
+def test_parse_upload_passes_in_range_params(monkeypatch):
+    calls = []
+
+    async def parse_image(image, **kwargs):
+        calls.append(kwargs)
+        raise RuntimeError("stop before inference")
+
+    monkeypatch.setattr(server, "_parse_image", parse_image)
+    client = TestClient(server.app)
+
+    client.post(
+        "/parse/upload?max_detections=200&min_confidence=0.3",
+        files={"file": ("a.png", _png_bytes(), "image/png")},
+    )
+
+    assert calls[0]["max_detections"] == 200
+    assert calls[0]["min_confidence"] == 0.3